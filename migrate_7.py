@@ -1,18 +1,28 @@
 #!/usr/bin/env python
 
 import logging
-import platform
 import os
+import re
+import stat
 import subprocess
 import shutil
 import json
+import rpm
 
 
 logger = None
+_completed_stages = None
 
-STATUS_JSON_FILE = '/var/run/rhel2centos.status.json'
+STATUS_FILE = '/var/run/rhel2centos.stages'
+LEGACY_STATUS_JSON_FILE = '/var/run/rhel2centos.status.json'
 SUPPORTED_MAJOR_VERSION_OS = 7
 SUPPORTED_NAME_OS = 'redhat'
+OS_RELEASE_FILE = '/etc/os-release'
+REDHAT_RELEASE_FILE = '/etc/redhat-release'
+_IS_EFI = os.path.exists('/sys/firmware/efi')
+OS_NAMES = {
+    'rhel': 'redhat',
+}
 
 
 def get_logger():
@@ -20,18 +30,52 @@ def get_logger():
     global logger
     if logger is not None:
         return logger
-    logger = logging.getLogger()
+    logger = logging.getLogger('rhel2centos')
     logger.setLevel(logging.INFO)
-    formatter = logging.Formatter('(%(asctime)s) [%(levelname)s] %(message)s')
+    logger.propagate = False
     file_handler = logging.FileHandler('/var/log/rhel2centos.log')
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(
+        logging.Formatter('(%(asctime)s) [%(levelname)s] %(message)s'),
+    )
+    # timestamps are kept only in the log file, so a time isn't
+    # formatted twice for every message
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(formatter)
+    stream_handler.setFormatter(
+        logging.Formatter('[%(levelname)s] %(message)s'),
+    )
     logger.addHandler(file_handler)
     logger.addHandler(stream_handler)
     return logger
 
 
+def _load_completed_stages():
+    # type() -> set(str)
+    """
+    Load names of completed migration's stages. The status file is read
+    only once, the next calls return the cached names
+    :return: set of names of completed stages
+    """
+    global _completed_stages
+    if _completed_stages is not None:
+        return _completed_stages
+    _completed_stages = set()
+    # progress saved by previous versions of the script, which kept
+    # the statuses as JSON
+    if os.path.exists(LEGACY_STATUS_JSON_FILE):
+        with open(LEGACY_STATUS_JSON_FILE, 'r') as status_file:
+            _completed_stages.update(
+                stage_name
+                for stage_name, status in json.load(status_file).items()
+                if status
+            )
+    if os.path.exists(STATUS_FILE):
+        with open(STATUS_FILE, 'r') as status_file:
+            _completed_stages.update(
+                line.strip() for line in status_file if line.strip()
+            )
+    return _completed_stages
+
+
 def get_stage_status(stage_name):
     # type(str) -> bool
     """
@@ -40,10 +84,7 @@ def get_stage_status(stage_name):
     :return: bool value of state
     """
 
-    if not os.path.exists(STATUS_JSON_FILE):
-        return False
-    with open(STATUS_JSON_FILE, 'r') as status_file:
-        return json.load(status_file).get(stage_name, False)
+    return stage_name in _load_completed_stages()
 
 
 def set_successful_stage_status(stage_name):
@@ -54,14 +95,14 @@ def set_successful_stage_status(stage_name):
     :return: None
     """
 
-    if os.path.exists(STATUS_JSON_FILE):
-        with open(STATUS_JSON_FILE, 'r') as status_file:
-            statuses = json.load(status_file)
-    else:
-        statuses = {}
-    statuses[stage_name] = True
-    with open(STATUS_JSON_FILE, 'w') as status_file:
-        json.dump(statuses, status_file, indent=4)
+    completed_stages = _load_completed_stages()
+    if stage_name in completed_stages:
+        return
+    completed_stages.add(stage_name)
+    # the status file is one stage name per line, a short appended
+    # line is written at once, so the file doesn't need rewriting
+    with open(STATUS_FILE, 'a') as status_file:
+        status_file.write(stage_name + '\n')
 
 
 def get_os_version_and_name():
@@ -72,10 +113,30 @@ def get_os_version_and_name():
     :return: major version, minor version, OS name
     """
 
-    os_name, os_version, _ = platform.dist()
-    if os_name == '':
+    os_release = {}
+    if os.path.exists(OS_RELEASE_FILE):
+        with open(OS_RELEASE_FILE, 'r') as os_release_file:
+            for line in os_release_file:
+                key, sep, value = line.strip().partition('=')
+                if sep:
+                    os_release[key] = value.strip('"\'')
+        os_name = os_release.get('ID', '')
+        os_version = os_release.get('VERSION_ID', '')
+    elif os.path.exists(REDHAT_RELEASE_FILE):
+        with open(REDHAT_RELEASE_FILE, 'r') as redhat_release_file:
+            release = redhat_release_file.read()
+        match = re.search(r'release (\d+(?:\.\d+)?)', release)
+        os_name = 'rhel' if release.startswith('Red Hat') else ''
+        os_version = match.group(1) if match else ''
+    else:
         return 0, 0, ''
-    return int(os_version[0]), int(os_version[2]), os_name
+    if os_name == '' or os_version == '':
+        return 0, 0, ''
+    os_version = os_version.split('.')
+    major_version = int(os_version[0])
+    minor_version = int(os_version[1]) if len(os_version) > 1 else 0
+    # platform.dist() which was used earlier names RHEL as "redhat"
+    return major_version, minor_version, OS_NAMES.get(os_name, os_name)
 
 
 def is_conversion_completed():
@@ -111,7 +172,28 @@ def is_efi_system():
     :return: True if EFI FS exists, otherwise - False
     """
 
-    return os.path.exists('/sys/firmware/efi')
+    return _IS_EFI
+
+
+def get_installed_pkgs(pkgs):
+    # type(list) -> list
+    """
+    Get installed rpm packages from a list using a single rpm query
+    :param pkgs: list of names of rpm packages
+    :return: list of names of installed packages in the same order
+    """
+    process = subprocess.Popen(
+        ['rpm', '-q', '--queryformat', '%{name}\n'] + pkgs,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    # rpm exits with the number of absent packages, so the return code
+    # isn't an error here. Absent ones are reported by lines
+    # "package <name> is not installed" instead of a bare name
+    output, _ = process.communicate()
+    installed_names = set(line.strip() for line in output.splitlines())
+    return [pkg for pkg in pkgs if pkg in installed_names]
 
 
 def remove_redhat_packages():
@@ -120,48 +202,66 @@ def remove_redhat_packages():
     Remove Red Hat related rpm packages if those are installed on a system
     :return: None
     """
-    if get_stage_status('remove_redhat_packages'):
-        return
+    log = get_logger()
     removed_pkgs = [
         'redhat-release-eula',
         'redhat-release-server',
         'redhat-logos',
     ]
-    get_logger().info(
+    log.info(
         'Remove Red Hat specific packages "%s"',
         removed_pkgs,
     )
+    installed_pkgs = get_installed_pkgs(removed_pkgs)
     for removed_pkg in removed_pkgs:
-        try:
-            subprocess.check_call(
-                'rpm -q %s &> /dev/null' % removed_pkg,
-                shell=True,
-                )
-        except subprocess.CalledProcessError:
-            get_logger().warning(
+        if removed_pkg not in installed_pkgs:
+            log.warning(
                 'Package "%s" is absent in system',
                 removed_pkg,
             )
-            continue
+    if not installed_pkgs:
+        return
+    try:
+        subprocess.check_output(
+            ['rpm', '-e', '--nodeps'] + installed_pkgs,
+            stderr=subprocess.STDOUT,
+        )
+        log.info(
+            'Packages "%s" are removed from system',
+            installed_pkgs,
+        )
+        return
+    except subprocess.CalledProcessError as error:
+        log.warning(
+            'Packages "%s" can\'t be removed at once, '
+            'try to remove them one by one.\n'
+            'Output of rpm:\n'
+            '%s',
+            installed_pkgs,
+            error.output,
+        )
+    failed = False
+    for removed_pkg in get_installed_pkgs(installed_pkgs):
         try:
             subprocess.check_output(
-                'rpm -e --nodeps %s 2>&1' % removed_pkg,
-                shell=True,
-                )
-            get_logger().info(
+                ['rpm', '-e', '--nodeps', removed_pkg],
+                stderr=subprocess.STDOUT,
+            )
+            log.info(
                 'Package "%s" is removed from system',
                 removed_pkg,
             )
         except subprocess.CalledProcessError as error:
-            get_logger().error(
+            log.error(
                 'Some error is occurred while erasing rpm package "%s".\n'
                 'Please check the following output:\n'
                 '%s',
                 removed_pkg,
                 error.output,
             )
-            exit(1)
-    set_successful_stage_status('remove_redhat_packages')
+            failed = True
+    if failed:
+        exit(1)
 
 
 def remove_not_needed_dirs():
@@ -170,25 +270,27 @@ def remove_not_needed_dirs():
     Remove not needed directory which prevent installing centos-release package
     :return: None
     """
-    if get_stage_status('remove_not_needed_dirs'):
-        return
+    log = get_logger()
     removed_dirs = [
         '/usr/share/redhat-release',
         '/usr/share/doc/redhat-release',
     ]
-    get_logger().info(
+    log.info(
         'Remove not needed Red Hat directories "%s"',
         removed_dirs,
     )
     for removed_dir in removed_dirs:
-        if os.path.isdir(removed_dir) and not os.path.islink(removed_dir):
+        try:
+            is_dir = stat.S_ISDIR(os.lstat(removed_dir).st_mode)
+        except OSError:
+            is_dir = False
+        if is_dir:
             shutil.rmtree(removed_dir)
         else:
-            get_logger().info(
+            log.info(
                 'Directory "%s" is absent in system',
                 removed_dir,
             )
-    set_successful_stage_status('remove_not_needed_dirs')
 
 
 def install_centos_packages():
@@ -197,8 +299,7 @@ def install_centos_packages():
     Install CentOS related rpm packages
     :return: None
     """
-    if get_stage_status('install_centos_packages'):
-        return
+    log = get_logger()
     installed_pkgs = {
         'centos-release':
             'http://mirror.centos.org/centos/7/os/x86_64/Packages'
@@ -207,70 +308,42 @@ def install_centos_packages():
             'http://mirror.centos.org/centos/7/os/x86_64/Packages'
             '/centos-logos-70.0.6-3.el7.centos.noarch.rpm'
     }
-    for installed_pkg_name, installed_pkg_url in installed_pkgs.iteritems():
-        try:
-            get_logger().info(
-                'Install CentOS package "%s"',
-                installed_pkg_name,
-            )
-            subprocess.check_output(
-                'yum localinstall %s -y &> /dev/null' % installed_pkg_url,
-                shell=True,
-                )
-            get_logger().info(
-                'CentOS package "%s" is installed',
-                installed_pkg_name,
-            )
-        except subprocess.CalledProcessError as error:
-            get_logger().error(
-                'Some error is occurred while installing '
-                'CentOS package "%s".\n',
-                'Please check the following output:\n'
-                '%s',
-                installed_pkg_name,
-                error.output,
-            )
-            exit(1)
-    set_successful_stage_status('install_centos_packages')
-
-
-def update_the_system():
-    # type() -> None
-    """
-    Run updating of a system
-    :return: None
-    """
-    if get_stage_status('update_the_system'):
-        return
+    log.info(
+        'Install CentOS packages "%s"',
+        list(installed_pkgs),
+    )
     try:
-        get_logger().info('Run updating of system')
-        subprocess.check_call(
-            'yum update -y',
-            shell=True,
+        subprocess.check_output(
+            ['yum', 'localinstall', '-y'] + list(installed_pkgs.values()),
+            stderr=subprocess.STDOUT,
         )
-    except subprocess.CalledProcessError:
-        get_logger().error(
-            'Some error is occurred while updating system.'
+    except subprocess.CalledProcessError as error:
+        log.error(
+            'Some error is occurred while installing '
+            'CentOS packages "%s".\n'
+            'Please check the following output:\n'
+            '%s',
+            list(installed_pkgs),
+            error.output,
         )
         exit(1)
-    get_logger().info('Updating of system is completed successful')
-    set_successful_stage_status('update_the_system')
+    for installed_pkg_name in installed_pkgs:
+        log.info(
+            'CentOS package "%s" is installed',
+            installed_pkg_name,
+        )
 
 
 def synchronization_of_distribution():
     # type() -> None
     """
-    Run yum distro-sync
+    Run yum distro-sync. It updates a system too,
+    so separate yum update isn't needed
     :return: None
     """
-    if get_stage_status('synchronization_of_distribution'):
-        return
     try:
         get_logger().info('Run synchronization of distribution')
-        subprocess.check_call(
-            'yum distro-sync -y',
-            shell=True,
-        )
+        subprocess.check_call(['yum', 'distro-sync', '-y'])
     except subprocess.CalledProcessError:
         get_logger().error(
             'Some error is occurred while synchronization of distribution.'
@@ -279,7 +352,6 @@ def synchronization_of_distribution():
     get_logger().info(
         'Synchronization of distribution is completed successful',
     )
-    set_successful_stage_status('synchronization_of_distribution')
 
 
 def recreate_grub_config(grub_config_path):
@@ -289,13 +361,11 @@ def recreate_grub_config(grub_config_path):
     :param grub_config_path: path to grub config
     :return: None
     """
-    if get_stage_status('recreate_grub_config'):
-        return
     try:
         subprocess.check_output(
-            'grub2-mkconfig -o %s 2>&1' % grub_config_path,
-            shell=True,
-            )
+            ['grub2-mkconfig', '-o', grub_config_path],
+            stderr=subprocess.STDOUT,
+        )
     except subprocess.CalledProcessError as error:
         get_logger().error(
             'Some error is occurred while recreating '
@@ -310,7 +380,6 @@ def recreate_grub_config(grub_config_path):
         'The grub config is recreated by path "%s" successful',
         grub_config_path,
     )
-    set_successful_stage_status('recreate_grub_config')
 
 
 def get_pkgs_related_to_secure_boot():
@@ -319,6 +388,7 @@ def get_pkgs_related_to_secure_boot():
     Get all of Secure Boot related rpm packages
     :return: Dictionary there is key - a package, value - vendor of a package
     """
+    log = get_logger()
     result = {}
     pkg_prefixes = (
         'shim',
@@ -327,34 +397,53 @@ def get_pkgs_related_to_secure_boot():
         'kernel-',
     )
     try:
-        output = subprocess.check_output(
-            'rpm -qa --queryformat "%{name}\t%{name}-%{version}-'
-            '%{release}.%{arch}\t%{vendor}\n" 2>&1',
-            shell=True,
+        match_iterator = rpm.TransactionSet().dbMatch()
+        # let rpm skip packages with other names instead of doing it here
+        match_iterator.pattern(
+            'name',
+            rpm.RPMMIRE_REGEX,
+            '^(%s)' % '|'.join(pkg_prefixes),
         )
-        for line in output.strip().split('\n'):
-            pkg_name, pkg, vendor = line.strip().split('\t')
-            if any(pkg_name.startswith(pkg_prefix)
-                   for pkg_prefix in pkg_prefixes):
-                get_logger().info(
-                    'The package "%s" relates to '
-                    'Secure Boot and released by "%s"',
-                    pkg,
-                    vendor,
-                )
-                result[pkg] = vendor.lower()
-    except subprocess.CalledProcessError as error:
-        get_logger().error(
+        for header in match_iterator:
+            pkg = '%s-%s-%s.%s' % (
+                header['name'],
+                header['version'],
+                header['release'],
+                header['arch'],
+            )
+            vendor = header['vendor'] or '(none)'
+            log.info(
+                'The package "%s" relates to '
+                'Secure Boot and released by "%s"',
+                pkg,
+                vendor,
+            )
+            result[pkg] = vendor.lower()
+    except rpm.error as error:
+        log.error(
             'Some error is occurred while getting list '
             'of secure boot related packages.\n'
             'Please check the following output:\n'
             '%s',
-            error.output,
+            error,
         )
         exit(1)
     return result
 
 
+def get_default_kernel():
+    # type() -> str
+    """
+    Get path to a kernel of default boot record using grubby
+    :return: path to a kernel
+    """
+    return subprocess.check_output(
+        ['grubby', '--default-kernel'],
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    ).strip()
+
+
 def get_kernel_pkg_name_for_default_boot_record():
     # type() -> dict(str, str)
     """
@@ -363,15 +452,15 @@ def get_kernel_pkg_name_for_default_boot_record():
              value - vendor of a kernel package
     """
     try:
-        kernel_path = subprocess.check_output(
-            'grubby --default-kernel 2>&1',
-            shell=True,
-        ).strip()
+        kernel_path = get_default_kernel()
         kernel_pkg_name, vendor = subprocess.check_output(
-            'rpm -qf "{}" --queryformat "%{{name}}-%{{version}}-'
-            '%{{release}}.%{{arch}}\t%{{vendor}}\n"'.format(kernel_path),
-            shell=True,
-        ).strip().split()
+            [
+                'rpm', '-qf', kernel_path, '--queryformat',
+                '%{name}-%{version}-%{release}.%{arch}\t%{vendor}\n',
+            ],
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        ).strip().split('\t')
         get_logger().info(
             'Kernel package name "%s" is set for default '
             'boot record and released by "%s"',
@@ -397,33 +486,33 @@ def reinstall_secure_boot_related_packages():
     packages if them vendor isn't CentOS
     :return: None
     """
-    if get_stage_status('reinstall_secure_boot_related_packages'):
-        return
+    log = get_logger()
     pkgs = get_pkgs_related_to_secure_boot()
     pkgs.update(get_kernel_pkg_name_for_default_boot_record())
-    for pkg, vendor in pkgs.iteritems():
-        if vendor == 'centos':
-            continue
+    pkgs_to_reinstall = sorted(
+        pkg for pkg, vendor in pkgs.items() if vendor != 'centos'
+    )
+    for pkg in pkgs_to_reinstall:
+        log.info(
+            'Package "%s" is released not by '
+            'CentOS and should reinstalled',
+            pkg,
+        )
+    if pkgs_to_reinstall:
         try:
-            get_logger().info(
-                'Package "%s" is released not by '
-                'CentOS and should reinstalled',
-                pkg,
-            )
             subprocess.check_output(
-                'yum reinstall -y "%s"' % pkg,
-                shell=True,
-                )
+                ['yum', 'reinstall', '-y'] + pkgs_to_reinstall,
+                stderr=subprocess.STDOUT,
+            )
         except subprocess.CalledProcessError as error:
-            get_logger().error(
+            log.error(
                 'Some error is occurred while reinstalling '
-                'a secure boot related package.\n'
+                'secure boot related packages.\n'
                 'Please check the following output:\n'
                 '%s',
                 error.output,
             )
             exit(1)
-    set_successful_stage_status('reinstall_secure_boot_related_packages')
 
 
 def add_boot_record_by_efibootmgr():
@@ -432,14 +521,12 @@ def add_boot_record_by_efibootmgr():
     Add a new EFI boot record for CentOS bootloader
     :return: None
     """
-    if get_stage_status('add_boot_record_by_efibootmgr'):
-        return
     bootloader_path = '/EFI/centos/shimx64.efi'
     try:
         subprocess.check_output(
-            'efibootmgr -c -L "CentOS Linux" -l "%s"' % bootloader_path,
-            shell=True,
-            )
+            ['efibootmgr', '-c', '-L', 'CentOS Linux', '-l', bootloader_path],
+            stderr=subprocess.STDOUT,
+        )
         get_logger().info(
             'The new EFI boot record is added for bootloader "%s"',
             bootloader_path,
@@ -452,31 +539,73 @@ def add_boot_record_by_efibootmgr():
             error.output,
         )
         exit(1)
-    set_successful_stage_status('add_boot_record_by_efibootmgr')
 
 
-def check_and_set_default_grub_record():
-    # type() -> None
+def get_grub_saved_entry(grub_env_path):
+    # type(str) -> str
     """
-    Check default GRUB record using grubby and set it to default kernel if
-        it's empty
+    Get saved default GRUB record from GRUB environment block
+    :param grub_env_path: path to GRUB environment block
+    :return: title of saved record or empty string if it isn't set
+    """
+    if not os.path.exists(grub_env_path):
+        return ''
+    with open(grub_env_path, 'r') as grub_env_file:
+        for line in grub_env_file:
+            if line.startswith('saved_entry='):
+                return line[len('saved_entry='):].rstrip('\n')
+    return ''
+
+
+def get_grub_menu_entries(grub_config_path):
+    # type(str) -> list
+    """
+    Get titles of GRUB records from GRUB config
+    :param grub_config_path: path to grub config
+    :return: list of titles of records
+    """
+    if not os.path.exists(grub_config_path):
+        return []
+    with open(grub_config_path, 'r') as grub_config:
+        return [
+            title for _, title in re.findall(
+                r'^\s*menuentry\s+([\'"])(.*?)\1',
+                grub_config.read(),
+                re.MULTILINE,
+            )
+        ]
+
+
+def check_and_set_default_grub_record(grub_config_path):
+    # type(str) -> None
+    """
+    Check default GRUB record and set it to default kernel if
+        it's empty. GRUB environment block and config are read directly,
+        grubby is called only if the saved record isn't found there
+    :param grub_config_path: path to grub config
     :return: None
     """
-    if get_stage_status('check_and_set_default_grub_record'):
+    # GRUB reads its environment block next to its config
+    saved_entry = get_grub_saved_entry(
+        os.path.join(os.path.dirname(grub_config_path), 'grubenv'),
+    )
+    if saved_entry and \
+            saved_entry in get_grub_menu_entries(grub_config_path):
         return
     try:
-        subprocess.check_call(
-            'grubby --info=DEFAULT &> /dev/null',
-            shell=True,
-        )
-        set_successful_stage_status('check_and_set_default_grub_record')
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(
+                ['grubby', '--info=DEFAULT'],
+                stdout=devnull,
+                stderr=devnull,
+            )
         return
     except subprocess.CalledProcessError:
         pass
     try:
         subprocess.check_output(
-            'grubby --set-default=`grubby --default-kernel`',
-            shell=True,
+            ['grubby', '--set-default=%s' % get_default_kernel()],
+            stderr=subprocess.STDOUT,
         )
         get_logger().info(
             'The default GRUB boot record is set for CentOS kernel',
@@ -489,7 +618,6 @@ def check_and_set_default_grub_record():
             error.output,
         )
         exit(1)
-    set_successful_stage_status('check_and_set_default_grub_record')
 
 
 def check_supported_os():
@@ -499,8 +627,6 @@ def check_supported_os():
     The functions checks major version and OS name.
     :return: None
     """
-    if get_stage_status('check_supported_os'):
-        return
     major_version, minor_version, os_name = get_os_version_and_name()
     if major_version != SUPPORTED_MAJOR_VERSION_OS:
         get_logger().info(
@@ -518,29 +644,48 @@ def check_supported_os():
             SUPPORTED_NAME_OS,
         )
         exit(0)
-    set_successful_stage_status('check_supported_os')
 
 
 def main():
     is_conversion_completed()
     is_run_under_root()
-    check_supported_os()
-    remove_redhat_packages()
-    remove_not_needed_dirs()
-    install_centos_packages()
-    update_the_system()
-    synchronization_of_distribution()
     if is_efi_system():
-        recreate_grub_config(
-            grub_config_path='/boot/efi/EFI/centos/grub.cfg'
-        )
-        reinstall_secure_boot_related_packages()
-        add_boot_record_by_efibootmgr()
+        grub_config_path = '/boot/efi/EFI/centos/grub.cfg'
+        boot_stages = [
+            ('recreate_grub_config', recreate_grub_config, {
+                'grub_config_path': grub_config_path,
+            }),
+            ('reinstall_secure_boot_related_packages',
+             reinstall_secure_boot_related_packages, {}),
+            ('add_boot_record_by_efibootmgr',
+             add_boot_record_by_efibootmgr, {}),
+        ]
     else:
-        recreate_grub_config(
-            grub_config_path='/boot/grub2/grub.cfg'
-        )
-    check_and_set_default_grub_record()
+        grub_config_path = '/boot/grub2/grub.cfg'
+        boot_stages = [
+            ('recreate_grub_config', recreate_grub_config, {
+                'grub_config_path': grub_config_path,
+            }),
+        ]
+    # every stage is a tuple of its name, function and keyword arguments
+    stages = [
+        ('check_supported_os', check_supported_os, {}),
+        ('remove_redhat_packages', remove_redhat_packages, {}),
+        ('remove_not_needed_dirs', remove_not_needed_dirs, {}),
+        ('install_centos_packages', install_centos_packages, {}),
+        ('synchronization_of_distribution',
+         synchronization_of_distribution, {}),
+    ] + boot_stages + [
+        ('check_and_set_default_grub_record',
+         check_and_set_default_grub_record, {
+             'grub_config_path': grub_config_path,
+         }),
+    ]
+    for stage_name, stage, kwargs in stages:
+        if get_stage_status(stage_name):
+            continue
+        stage(**kwargs)
+        set_successful_stage_status(stage_name)
     set_successful_stage_status('completed')
     get_logger().info('The system is migrated to CentOS 7')
 